@@ -0,0 +1,330 @@
+import argparse
+import bisect
+import functools
+import ipaddress
+import mmap
+import os
+import struct
+import sys
+import time
+from datetime import datetime
+
+# Access log configuration
+ACCESS_LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "access_logs")
+SEGMENT_RECORDS = 1_000_000  # records per segment file (~52 MB) before rotating
+MAX_SEGMENTS = 20            # oldest segments are deleted beyond this many
+
+# Segment layout: a 64-byte header followed by fixed-size records.
+# Header: magic, version, record size, capacity, record count, creation time, writer pid
+HEADER = struct.Struct("<4sHHIIdI")
+HEADER_SIZE = 64
+COUNT_OFFSET = 12
+MAGIC = b"LBAL"
+VERSION = 1
+
+# Record: completion timestamp, client ip (IPv6 or IPv4-mapped), client port, backend port,
+# backend id, operation code, status, latency in ms, request bytes, response bytes
+RECORD = struct.Struct("<d16sHH8sBBxxfII")
+
+OPERATIONS = ("unknown", "fibonacci", "prime", "reverse", "palindrome", "wordcount", "echo", "square")
+OPERATION_CODES = {name: code for code, name in enumerate(OPERATIONS)}
+
+STATUS_OK = 0
+STATUS_ERROR = 1        # backend answered with an error
+STATUS_UNAVAILABLE = 2  # no backend could serve the request
+STATUSES = ("ok", "error", "unavailable")
+
+# ------------------ Encoding Helpers ------------------
+@functools.lru_cache(maxsize=4096)
+def pack_address(host):
+    """Encode an IP address as 16 bytes (IPv4 addresses are IPv4-mapped)."""
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return bytes(16)
+    if address.version == 4:
+        address = ipaddress.IPv6Address(f"::ffff:{address}")
+    return address.packed
+
+def unpack_address(packed):
+    address = ipaddress.IPv6Address(packed)
+    return str(address.ipv4_mapped or address)
+
+def list_segments(directory=ACCESS_LOG_DIR):
+    """Segment files are named access-<start ns>-<pid>.seg, so names sort by start time."""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory) if name.startswith("access-") and name.endswith(".seg"))
+    return [os.path.join(directory, name) for name in names]
+
+# ------------------ Writer ------------------
+class AccessLog:
+    """Append-only access log written to memory-mapped, size-rotated segment files."""
+
+    def __init__(self, directory=ACCESS_LOG_DIR, segment_records=SEGMENT_RECORDS, max_segments=MAX_SEGMENTS):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.max_segments = max_segments
+        self.file = None
+        self.map = None
+        self.count = 0
+        os.makedirs(directory, exist_ok=True)
+        self._open_segment()
+
+    def _open_segment(self):
+        path = os.path.join(self.directory, f"access-{time.time_ns():020d}-{os.getpid()}.seg")
+        size = HEADER_SIZE + self.segment_records * RECORD.size
+        segment_file = open(path, "w+b")
+        try:
+            if hasattr(os, "posix_fallocate"):
+                # Reserve the blocks up front: storing into a sparse page of the map when the
+                # disk is full raises SIGBUS, while a failed allocation is an OSError here
+                os.posix_fallocate(segment_file.fileno(), 0, size)
+            else:
+                segment_file.truncate(size)
+        except OSError:
+            segment_file.close()
+            os.remove(path)
+            raise
+        self.file = segment_file
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, RECORD.size, self.segment_records, 0, time.time(), os.getpid())
+        self.count = 0
+        for old in list_segments(self.directory)[:-self.max_segments]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def _close_segment(self):
+        """Unmap the current segment and shrink the file to the records actually written."""
+        self.map.flush()
+        self.map.close()
+        self.file.truncate(HEADER_SIZE + self.count * RECORD.size)
+        self.file.close()
+        self.map = self.file = None
+
+    def append(self, timestamp, client, backend_port, backend_id, operation, status,
+               latency_ms, bytes_in, bytes_out):
+        """Append one access record.
+
+        `timestamp` is the request's completion time (keeping segments time-ordered) and
+        `client` is a (host, port, ...) peername tuple or None. Raises OSError if a new
+        segment cannot be allocated; the next append tries again.
+        """
+        if self.map is None or self.count == self.segment_records:
+            if self.map is not None:
+                self._close_segment()
+            self._open_segment()
+        client_host, client_port = (client[0], client[1]) if client else ("", 0)
+        RECORD.pack_into(self.map, HEADER_SIZE + self.count * RECORD.size,
+                         timestamp, pack_address(client_host), client_port, backend_port or 0,
+                         (backend_id or "").encode("utf-8")[:8], OPERATION_CODES.get(operation, 0),
+                         status, latency_ms, bytes_in, bytes_out)
+        # Publish the record only after it is fully written so readers never see a partial one
+        self.count += 1
+        struct.pack_into("<I", self.map, COUNT_OFFSET, self.count)
+
+    def close(self):
+        if self.map is not None:
+            self._close_segment()
+
+# ------------------ Reader ------------------
+def open_segment(path):
+    """Map a segment read-only and return (mmap, record count), or (None, 0) if it is empty or invalid."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < HEADER_SIZE:
+            return None, 0
+        segment = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, record_size, _, count, _, _ = HEADER.unpack_from(segment, 0)
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        segment.close()
+        return None, 0
+    return segment, count
+
+class _Timestamps:
+    """Sequence view of a segment's record timestamps, for bisect."""
+
+    def __init__(self, segment, count):
+        self.segment = segment
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return struct.unpack_from("<d", self.segment, HEADER_SIZE + index * RECORD.size)[0]
+
+def iter_records(directory=ACCESS_LOG_DIR, since=None, until=None):
+    """Yield raw record tuples with since <= timestamp < until.
+
+    Records are appended in completion order, so each segment is sorted by timestamp:
+    segments entirely outside the window are skipped by their first and last record,
+    and the window inside a segment is found by binary search.
+    """
+    for path in list_segments(directory):
+        segment, count = open_segment(path)
+        if not count:
+            continue
+        try:
+            timestamps = _Timestamps(segment, count)
+            if since is not None and timestamps[count - 1] < since:
+                continue
+            if until is not None and timestamps[0] >= until:
+                continue
+            first = bisect.bisect_left(timestamps, since) if since is not None else 0
+            last = bisect.bisect_left(timestamps, until) if until is not None else count
+            view = memoryview(segment)[HEADER_SIZE + first * RECORD.size:HEADER_SIZE + last * RECORD.size]
+            records = RECORD.iter_unpack(view)
+            try:
+                yield from records
+            finally:
+                # The iterator holds a buffer export that must be gone before the view is released
+                del records
+                view.release()
+        finally:
+            segment.close()
+
+def decode(record):
+    """Turn a raw record tuple into a dict of readable fields."""
+    timestamp, client, client_port, backend_port, backend_id, op, status, latency_ms, bytes_in, bytes_out = record
+    return {
+        "timestamp": timestamp,
+        "client": f"{unpack_address(client)}:{client_port}",
+        "backend": backend_id.rstrip(b"\0").decode("utf-8", "replace"),
+        "backend_port": backend_port,
+        "operation": OPERATIONS[op] if op < len(OPERATIONS) else "unknown",
+        "status": STATUSES[status] if status < len(STATUSES) else str(status),
+        "latency_ms": latency_ms,
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+    }
+
+def format_record(fields):
+    stamp = datetime.fromtimestamp(fields["timestamp"]).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    return (f"[{stamp}] {fields['client']} -> {fields['backend'] or '-'}:{fields['backend_port']} "
+            f"{fields['operation']} {fields['status']} {fields['latency_ms']:.2f}ms "
+            f"in={fields['bytes_in']}B out={fields['bytes_out']}B")
+
+def tail(n=50, directory=ACCESS_LOG_DIR):
+    """Return the newest n records (decoded), newest first."""
+    newest = []
+    for path in reversed(list_segments(directory)):
+        segment, count = open_segment(path)
+        if not count:
+            continue
+        try:
+            start = max(0, count - n)
+            view = memoryview(segment)[HEADER_SIZE + start * RECORD.size:HEADER_SIZE + count * RECORD.size]
+            try:
+                newest.extend(RECORD.iter_unpack(view))
+            finally:
+                view.release()
+        finally:
+            segment.close()
+        # Segments of concurrent writers overlap in time, so look one segment past n records
+        if len(newest) >= 2 * n:
+            break
+    newest.sort(key=lambda record: record[0], reverse=True)
+    return [decode(record) for record in newest[:n]]
+
+# ------------------ Query CLI ------------------
+def parse_time(value):
+    """Accept epoch seconds, an ISO date/time, or a relative age such as 15m / 2h / 30s."""
+    if value is None:
+        return None
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if value[-1] in units and value[:-1].replace(".", "", 1).isdigit():
+        return time.time() - float(value[:-1]) * units[value[-1]]
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def build_filter(args):
+    """Compile the CLI filters into a predicate on raw record tuples."""
+    op = OPERATION_CODES.get(args.op) if args.op else None
+    status = STATUSES.index(args.status) if args.status else None
+    backend = args.backend.encode("utf-8")[:8].ljust(8, b"\0") if args.backend else None
+    client = pack_address(args.client) if args.client else None
+    min_latency = args.min_latency
+
+    def matches(record):
+        return ((op is None or record[5] == op)
+                and (status is None or record[6] == status)
+                and (backend is None or record[4] == backend)
+                and (client is None or record[1] == client)
+                and (min_latency is None or record[7] >= min_latency))
+    return matches
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+def print_stats(records, group_by):
+    field = {"backend": 4, "op": 5, "status": 6, "client": 1}[group_by]
+    groups = {}
+    first = last = None
+    for record in records:
+        group = groups.setdefault(record[field], [0, 0, 0, 0, []])
+        group[0] += 1
+        group[1] += record[6] != STATUS_OK
+        group[2] += record[8]
+        group[3] += record[9]
+        group[4].append(record[7])
+        first = record[0] if first is None else min(first, record[0])
+        last = record[0] if last is None else max(last, record[0])
+    if not groups:
+        print("No matching records.")
+        return
+    span = max(last - first, 1e-9)
+    print(f"{group_by:<16}{'count':>10}{'errors':>8}{'req/s':>10}{'p50ms':>10}{'p95ms':>10}{'p99ms':>10}{'maxms':>10}{'in':>12}{'out':>12}")
+    for key, (count, errors, bytes_in, bytes_out, latencies) in sorted(groups.items(), key=lambda item: -item[1][0]):
+        latencies.sort()
+        if group_by == "backend":
+            label = key.rstrip(b"\0").decode("utf-8", "replace") or "-"
+        elif group_by == "op":
+            label = OPERATIONS[key] if key < len(OPERATIONS) else "unknown"
+        elif group_by == "status":
+            label = STATUSES[key] if key < len(STATUSES) else str(key)
+        else:
+            label = unpack_address(key)
+        print(f"{label:<16}{count:>10}{errors:>8}{count / span:>10.1f}{percentile(latencies, 0.5):>10.2f}"
+              f"{percentile(latencies, 0.95):>10.2f}{percentile(latencies, 0.99):>10.2f}{latencies[-1]:>10.2f}"
+              f"{bytes_in:>12}{bytes_out:>12}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the load balancer's binary access log.")
+    parser.add_argument("command", choices=["query", "stats", "tail"])
+    parser.add_argument("--dir", default=ACCESS_LOG_DIR, help="access log directory")
+    parser.add_argument("--since", help="start time: epoch seconds, ISO time, or age like 15m")
+    parser.add_argument("--until", help="end time: epoch seconds, ISO time, or age like 5m")
+    parser.add_argument("--backend", help="backend identifier")
+    parser.add_argument("--op", choices=OPERATIONS, help="operation")
+    parser.add_argument("--status", choices=STATUSES, help="request status")
+    parser.add_argument("--client", help="client IP address")
+    parser.add_argument("--min-latency", type=float, help="only requests at least this slow (ms)")
+    parser.add_argument("--by", choices=["backend", "op", "status", "client"], default="backend",
+                        help="grouping for the stats command")
+    parser.add_argument("-n", "--limit", type=int, default=50, help="maximum records for query/tail")
+    args = parser.parse_args()
+
+    if args.command == "tail":
+        for fields in reversed(tail(args.limit, args.dir)):
+            print(format_record(fields))
+        return
+    matches = build_filter(args)
+    records = (record for record in iter_records(args.dir, parse_time(args.since), parse_time(args.until))
+               if matches(record))
+    if args.command == "stats":
+        print_stats(records, args.by)
+        return
+    for shown, record in enumerate(records):
+        if shown == args.limit:
+            break
+        print(format_record(decode(record)))
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        sys.exit(0)
@@ -0,0 +1,311 @@
+import argparse
+import json
+import signal
+import socket
+import subprocess
+import sys
+import time
+import redis
+
+# Autoscaler configuration
+SERVER_HOST = 'localhost'
+SERVER_FILE = "server.py"
+PORT_RANGE = (13010, 13049)  # inclusive range of ports handed to autoscaled replicas
+MIN_REPLICAS = 1
+MAX_REPLICAS = 8
+REPLICA_WORKERS = 1  # worker processes per replica (server.py --workers)
+CHECK_INTERVAL = 2  # seconds between scaling decisions
+
+# Scale out when any signal is above its high watermark; scale in only when all are below the low one.
+# The gap between the two watermarks is the hysteresis band.
+SCALE_UP_PENDING_PER_BACKEND = 4      # queued client requests per routable backend
+SCALE_DOWN_PENDING_PER_BACKEND = 1
+SCALE_UP_P95_MS = 500                 # p95 forwarding latency reported by the load balancer
+SCALE_DOWN_P95_MS = 100
+SCALE_UP_UTILIZATION = 3              # average in-flight requests per routable backend
+SCALE_DOWN_UTILIZATION = 0.5
+SCALE_UP_STREAK = 2                   # consecutive hot checks required before scaling out
+SCALE_DOWN_STREAK = 5                 # consecutive cold checks required before scaling in
+SCALE_UP_COOLDOWN = 10                # seconds after any scaling action before scaling out again
+SCALE_DOWN_COOLDOWN = 30              # seconds after any scaling action before scaling in again
+
+STARTUP_TIMEOUT = 10  # seconds a new replica has to answer PING before it is killed
+DRAIN_TIMEOUT = 30    # seconds a draining replica may keep in-flight requests before termination
+METRICS_STALE_AFTER = 5  # ignore load balancer metrics older than this many seconds
+
+redis_client = redis.Redis(host='localhost', port=6379, decode_responses=True)
+
+# Replicas managed by this autoscaler: key=port, value=dict(id, process, state, since)
+# state is one of "starting", "active" or "draining".
+replicas = {}
+
+# ------------------ JSON Helper Functions ------------------
+def send_json(sock, message):
+    """Send a JSON message with newline termination."""
+    sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+def recv_json(sock):
+    """Receive a newline-delimited JSON message."""
+    data = b""
+    while b"\n" not in data:
+        chunk = sock.recv(1024)
+        if not chunk:
+            return None
+        data += chunk
+    try:
+        return json.loads(data.decode("utf-8").strip())
+    except Exception:
+        return None
+
+# ------------------ Logging Helper ------------------
+def log_to_redis(message):
+    """Print a log message and push it into the shared load balancer log list.
+
+    Redis being unavailable never stops the autoscaler from logging to stdout.
+    """
+    print(message)
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        redis_client.lpush("lb_logs", f"[{timestamp}] [autoscaler] {message}")
+        redis_client.ltrim("lb_logs", 0, 99)
+    except redis.RedisError as e:
+        print(f"Error logging to Redis: {e}")
+
+# ------------------ Replica Helpers ------------------
+def backend_key(port):
+    return f"{SERVER_HOST}:{port}"
+
+def ping(port):
+    """Return True if the backend on the given port answers a health check PING."""
+    try:
+        with socket.create_connection((SERVER_HOST, port), timeout=1) as s:
+            send_json(s, {"type": "PING"})
+            response = recv_json(s)
+            return bool(response and response.get("type") == "PONG")
+    except OSError:
+        return False
+
+def port_is_free(port):
+    """Check whether nothing else is bound to the given port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        try:
+            s.bind(("0.0.0.0", port))
+            return True
+        except OSError:
+            return False
+
+def spawn_replica():
+    """Start a new server.py process on the first free port of the configured range."""
+    for port in range(PORT_RANGE[0], PORT_RANGE[1] + 1):
+        if port in replicas or not port_is_free(port):
+            continue
+        server_id = f"auto-{port}"
+        # Own session so a Ctrl+C on the autoscaler does not kill replicas before they drain
+        try:
+            process = subprocess.Popen([sys.executable, SERVER_FILE, server_id, str(port), "--workers", str(REPLICA_WORKERS)],
+                                       start_new_session=True)
+        except OSError as e:
+            log_to_redis(f"Cannot start replica {server_id} on port {port}: {e}")
+            return None
+        replicas[port] = {"id": server_id, "process": process, "state": "starting", "since": time.time()}
+        log_to_redis(f"Spawned replica {server_id} on port {port} (pid {process.pid})")
+        return port
+    log_to_redis(f"No free port left in range {PORT_RANGE[0]}-{PORT_RANGE[1]}, cannot scale out")
+    return None
+
+def retire_replica(port):
+    """Stop routing new requests to a replica; it is terminated once drained."""
+    replica = replicas[port]
+    redis_client.sadd("backend_draining", backend_key(port))
+    replica["state"] = "draining"
+    replica["since"] = time.time()
+    log_to_redis(f"Draining replica {replica['id']} on port {port}")
+
+def remove_replica(port):
+    """Terminate a replica process and remove it from the load balancer registry."""
+    replica = replicas.pop(port)
+    process = replica["process"]
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    try:
+        redis_client.hdel("backend_registry", backend_key(port))
+        redis_client.srem("backend_draining", backend_key(port))
+    except redis.RedisError as e:
+        # The load balancer's health check marks the dead entry down; the next start clears it
+        print(f"Error deregistering replica {replica['id']}: {e}")
+    log_to_redis(f"Removed replica {replica['id']} on port {port}")
+
+def update_replicas(backend_inflight, drain_applied):
+    """Advance starting and draining replicas and reap replicas that died on their own."""
+    now = time.time()
+    for port, replica in list(replicas.items()):
+        if replica["process"].poll() is not None:
+            log_to_redis(f"Replica {replica['id']} on port {port} exited with code {replica['process'].returncode}")
+            remove_replica(port)
+        elif replica["state"] == "starting":
+            if ping(port):
+                # Registering makes the load balancer health-check and then route to the replica
+                redis_client.hset("backend_registry", backend_key(port), replica["id"])
+                replica["state"] = "active"
+                replica["since"] = now
+                log_to_redis(f"Registered replica {replica['id']} on port {port}")
+            elif now - replica["since"] > STARTUP_TIMEOUT:
+                log_to_redis(f"Replica {replica['id']} on port {port} did not become ready in {STARTUP_TIMEOUT}s")
+                remove_replica(port)
+        elif replica["state"] == "draining":
+            # The in-flight count is only final once the load balancer reports it has applied the drain mark
+            key = backend_key(port)
+            drained = key in drain_applied and int(backend_inflight.get(key, 0)) == 0
+            if drained or now - replica["since"] > DRAIN_TIMEOUT:
+                remove_replica(port)
+
+# ------------------ Scaling Decisions ------------------
+def read_metrics():
+    """Return (lb_metrics, backend_inflight, drain_applied) as published by the load balancer.
+
+    Read in one transaction so the in-flight counts and the applied drain set come from the same publish.
+    """
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.hgetall("lb_metrics")
+    pipe.hgetall("backend_inflight")
+    pipe.smembers("backend_draining_applied")
+    metrics, backend_inflight, drain_applied = pipe.execute()
+    return metrics, backend_inflight, drain_applied
+
+def classify_load(metrics, backend_inflight):
+    """Return "hot", "cold" or "steady" for the current load balancer metrics."""
+    draining = redis_client.smembers("backend_draining")
+    routable = max(1, int(metrics.get("healthy_backends", 0)))
+    pending = int(metrics.get("pending_requests", 0)) / routable
+    p95 = float(metrics.get("p95_latency_ms", 0))
+    busy = [int(count) for key, count in backend_inflight.items() if key not in draining]
+    utilization = sum(busy) / routable
+    if pending > SCALE_UP_PENDING_PER_BACKEND or p95 > SCALE_UP_P95_MS or utilization > SCALE_UP_UTILIZATION:
+        return "hot"
+    if pending < SCALE_DOWN_PENDING_PER_BACKEND and p95 < SCALE_DOWN_P95_MS and utilization < SCALE_DOWN_UTILIZATION:
+        return "cold"
+    return "steady"
+
+def newest_active_replica():
+    active = [port for port, replica in replicas.items() if replica["state"] == "active"]
+    if not active:
+        return None
+    return max(active, key=lambda port: replicas[port]["since"])
+
+def clear_stale_registrations():
+    """Drop registry entries in our port range left behind by a previous autoscaler run."""
+    for key in redis_client.hkeys("backend_registry"):
+        host, _, port = key.rpartition(":")
+        if host == SERVER_HOST and port.isdigit() and PORT_RANGE[0] <= int(port) <= PORT_RANGE[1]:
+            redis_client.hdel("backend_registry", key)
+            redis_client.srem("backend_draining", key)
+
+def run():
+    clear_stale_registrations()
+    log_to_redis(f"Autoscaler started with {MIN_REPLICAS}-{MAX_REPLICAS} replicas on ports {PORT_RANGE[0]}-{PORT_RANGE[1]}")
+    state = {"hot_streak": 0, "cold_streak": 0, "last_scale": 0.0}
+    while True:
+        try:
+            scale_once(state)
+        except redis.RedisError as e:
+            # Hold the current size until Redis is back; replicas keep running
+            print(f"Error talking to Redis, skipping this check: {e}")
+            state["hot_streak"] = state["cold_streak"] = 0
+        except Exception as e:
+            # One bad check (e.g. a malformed metric) must not take every replica down with the autoscaler
+            print(f"Error in scaling check, skipping it: {e}")
+            state["hot_streak"] = state["cold_streak"] = 0
+        time.sleep(CHECK_INTERVAL)
+
+def scale_once(state):
+    """Run one scaling check: advance replica states, then scale out or in if warranted."""
+    hot_streak, cold_streak, last_scale = state["hot_streak"], state["cold_streak"], state["last_scale"]
+    metrics, backend_inflight, drain_applied = read_metrics()
+    updated_at = float(metrics.get("updated_at", 0))
+    update_replicas(backend_inflight, drain_applied)
+
+    serving = [port for port, replica in replicas.items() if replica["state"] != "draining"]
+    now = time.time()
+    if len(serving) < MIN_REPLICAS:
+        spawn_replica()
+    elif len(serving) > MAX_REPLICAS:
+        port = newest_active_replica()
+        if port is not None:
+            retire_replica(port)
+    elif now - updated_at > METRICS_STALE_AFTER:
+        # Load balancer is not publishing metrics; hold the current size
+        hot_streak = cold_streak = 0
+    else:
+        load = classify_load(metrics, backend_inflight)
+        hot_streak = hot_streak + 1 if load == "hot" else 0
+        cold_streak = cold_streak + 1 if load == "cold" else 0
+        if (hot_streak >= SCALE_UP_STREAK and len(serving) < MAX_REPLICAS
+                and now - last_scale >= SCALE_UP_COOLDOWN):
+            if spawn_replica() is not None:
+                last_scale = now
+            hot_streak = 0
+        elif (cold_streak >= SCALE_DOWN_STREAK and len(serving) > MIN_REPLICAS
+                and now - last_scale >= SCALE_DOWN_COOLDOWN):
+            port = newest_active_replica()
+            if port is not None:
+                retire_replica(port)
+                last_scale = now
+            cold_streak = 0
+    state.update(hot_streak=hot_streak, cold_streak=cold_streak, last_scale=last_scale)
+
+def shutdown():
+    """Drain and terminate every managed replica.
+
+    Without Redis the drain cannot be observed, so replicas are terminated once DRAIN_TIMEOUT passes.
+    """
+    for port, replica in list(replicas.items()):
+        if replica["state"] == "starting":
+            remove_replica(port)
+        elif replica["state"] == "active":
+            try:
+                retire_replica(port)
+            except redis.RedisError as e:
+                print(f"Error marking replica {replica['id']} as draining: {e}")
+                replica["state"] = "draining"
+                replica["since"] = time.time()
+    while replicas:
+        try:
+            _, backend_inflight, drain_applied = read_metrics()
+            update_replicas(backend_inflight, drain_applied)
+        except Exception as e:
+            # Without usable metrics only exits and DRAIN_TIMEOUT retire replicas
+            print(f"Error checking drained replicas: {e}")
+            update_replicas({}, set())
+        time.sleep(0.5)
+
+def main():
+    global MIN_REPLICAS, MAX_REPLICAS, PORT_RANGE
+    parser = argparse.ArgumentParser(description="Scale server.py replicas behind the load balancer.")
+    parser.add_argument("--min", type=int, default=MIN_REPLICAS, help="minimum number of replicas")
+    parser.add_argument("--max", type=int, default=MAX_REPLICAS, help="maximum number of replicas")
+    parser.add_argument("--ports", default=f"{PORT_RANGE[0]}-{PORT_RANGE[1]}",
+                        help="inclusive port range for replicas, e.g. 13010-13049")
+    args = parser.parse_args()
+    if args.min < 0 or args.max < args.min:
+        parser.error("replica bounds must satisfy 0 <= --min <= --max")
+    first, last = (int(p) for p in args.ports.split("-"))
+    MIN_REPLICAS, MAX_REPLICAS, PORT_RANGE = args.min, args.max, (first, last)
+    # SIGTERM shuts down like Ctrl+C, so replicas in their own sessions are never left behind
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        print("Autoscaler stopping, draining replicas...")
+        shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -17,8 +17,33 @@ async def recv_json(reader: asyncio.StreamReader):
     except Exception:
         return None
 
+async def request_with_retry(connection: list, request: dict):
+    """Send a request over the persistent connection and return the response.
+
+    The load balancer closes idle connections (after CLIENT_IDLE_TIMEOUT, and during a hot
+    restart), so if the connection turns out to be closed or reset, reopen it and send the
+    request once more. `connection` is the [reader, writer] pair and is updated in place.
+    """
+    for attempt in range(2):
+        reader, writer = connection
+        try:
+            await send_json(writer, request)
+            data = await reader.readline()
+        except ConnectionError:
+            data = b""
+        if data:
+            try:
+                return json.loads(data.decode("utf-8").strip())
+            except Exception:
+                return None
+        writer.close()
+        if attempt == 0:
+            print("Connection closed by the Load Balancer, reconnecting...")
+            connection[:] = await asyncio.open_connection(LB_HOST, LB_PORT)
+    return None
+
 async def client():
-    reader, writer = await asyncio.open_connection(LB_HOST, LB_PORT)
+    connection = list(await asyncio.open_connection(LB_HOST, LB_PORT))
     print("Connected to Load Balancer (persistent connection).")
     try:
         while True:
@@ -38,8 +63,7 @@ async def client():
             else:
                 print("Invalid choice.")
                 continue
-            await send_json(writer, request)
-            response = await recv_json(reader)
+            response = await request_with_retry(connection, request)
             if response:
                 print(f"Response from server (via LB): {response}")
             else:
@@ -47,8 +71,12 @@ async def client():
     except Exception as e:
         print("Error:", e)
     finally:
+        writer = connection[1]
         writer.close()
-        await writer.wait_closed()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
 
 def main():
     asyncio.run(client())
@@ -4,6 +4,7 @@ import socket
 import json
 import subprocess
 import psutil
+import access_log
 
 app = Flask(__name__)
 redis_client = redis.Redis(host='localhost', port=6379, decode_responses=True)
@@ -83,6 +84,9 @@ def dashboard():
     logs = redis_client.lrange("lb_logs", 0, 50)
     logs_text = "\n".join(logs)
 
+    # Tail the newest access log records written by the load balancer.
+    access_text = "\n".join(access_log.format_record(record) for record in access_log.tail(50))
+
     html_template = '''
     <html>
     <head>
@@ -152,6 +156,11 @@ def dashboard():
             {% endif %}
         </div>
         
+        <div class="section">
+            <h2>Recent Requests</h2>
+            <pre>{{ access_text }}</pre>
+        </div>
+
         <div class="section">
             <h2>Load Balancer Logs</h2>
             <pre>{{ logs_text }}</pre>
@@ -162,6 +171,7 @@ def dashboard():
     return render_template_string(html_template,
                                   server_status=server_status,
                                   logs_text=logs_text,
+                                  access_text=access_text,
                                   result=result)
 
 # Route to start a server process.
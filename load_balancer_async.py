@@ -1,8 +1,18 @@
+import argparse
 import asyncio
+import itertools
 import json
+import os
+import signal
+import socket
+import stat
+import struct
+import tempfile
 import time
+from collections import deque
 from asyncio import StreamReader, StreamWriter
 import redis.asyncio as redis
+from access_log import AccessLog, ACCESS_LOG_DIR, OPERATION_CODES, STATUS_OK, STATUS_ERROR, STATUS_UNAVAILABLE
 
 # Load Balancer configuration
 LB_HOST = 'localhost'
@@ -20,6 +30,91 @@ server_status = {(host, port): True for host, port, _ in backend_servers}
 next_server_index = 0
 status_lock = asyncio.Lock()
 
+# Backends registered at runtime (e.g. by autoscaler.py) live in the Redis hash
+# "backend_registry" ("host:port" -> identifier). Members of the Redis set
+# "backend_draining" stay connected but receive no new requests.
+REGISTRY_SYNC_INTERVAL = 1
+METRICS_INTERVAL = 1
+static_servers = {(host, port) for host, port, _ in backend_servers}
+draining_servers = set()
+health_tasks = {}
+
+# Load signals published to Redis for the autoscaler and dashboard
+pending_requests = 0  # client requests received but not yet answered
+inflight = {(host, port): 0 for host, port, _ in backend_servers}
+LATENCY_WINDOW = 30  # seconds of forwarding latencies used for the p95 signal
+latency_samples = deque(maxlen=1000)  # (completed_at, latency) pairs in seconds
+
+# Cost-aware routing: each request is weighted by its estimated backend time in
+# milliseconds, and backends are chosen by outstanding cost instead of request count.
+DEFAULT_COST_MS = 1.0  # estimate for operations that have not been observed yet
+COST_DECAY = 0.99      # weight kept by older observations each time an operation completes
+# Once an operation has this many observations, a sample is capped at COST_OUTLIER_FACTOR times
+# the current estimate, so one stalled request cannot inflate the model for hundreds of requests
+COST_CLIP_AFTER = 10
+COST_OUTLIER_FACTOR = 4.0
+outstanding_cost = {(host, port): 0.0 for host, port, _ in backend_servers}
+# Worker processes per backend as reported in its PONG (server.py --workers N)
+backend_capacity = {}
+# Per-operation decayed sums for a 1-D least-squares fit of service time (ms) against request size:
+# [weight, sum_x, sum_y, sum_xx, sum_xy]
+cost_stats = {}
+
+# Backends (by identifier) reserved for cheap requests, e.g. {"A"}. Expensive requests
+# only use them when no other backend is available.
+FAST_LANE_SERVERS = set()
+CHEAP_COST_MS = 5.0
+
+# Per-request access records go to a local binary log (see access_log.py) instead of Redis
+ACCESS_LOG_ENABLED = True
+access_log = None
+requests_unpublished = 0  # requests not yet added to the Redis "requests_processed" counter
+
+# Optional request trace for replay.py: one JSON line per request with its arrival time,
+# client connection id and the LB-side latency (enabled with --record-trace PATH)
+TRACE_PATH = None
+trace_file = None
+# Ids are "<pid>-<n>" so connections stay distinct when a hot-restarted process appends to the same trace
+connection_ids = itertools.count(1)
+
+# Client connection limits and socket options
+CLIENT_IDLE_TIMEOUT = 300           # seconds a client connection may sit idle between requests
+CLIENT_READ_TIMEOUT = 10            # seconds to receive the rest of a request once it has started
+CLIENT_CLOSE_TIMEOUT = 5            # seconds to flush a closing connection before aborting it
+MAX_REQUEST_BYTES = 64 * 1024       # longest accepted request line
+MAX_REQUESTS_PER_CONNECTION = 1000  # close a connection after this many requests (0 = unlimited)
+MAX_CONNECTIONS = 10000             # new connections beyond this are rejected with an error
+ACCEPT_BACKLOG = 1024
+CLIENT_TCP_NODELAY = True
+CLIENT_TCP_KEEPALIVE = True
+TCP_KEEPALIVE_IDLE = 60             # seconds before the first keepalive probe
+TCP_KEEPALIVE_INTERVAL = 10
+TCP_KEEPALIVE_COUNT = 5
+# Connection counters published to the Redis hash "lb_connections"
+connection_stats = {
+    "active": 0,
+    "accepted": 0,
+    "rejected": 0,
+    "idle_timeouts": 0,
+    "read_timeouts": 0,
+    "oversized_requests": 0,
+    "request_limit_closes": 0,
+}
+
+# Hot restart: a new process started with --takeover receives the listening sockets over a
+# Unix socket (SCM_RIGHTS) and starts accepting; the old process then stops accepting,
+# finishes in-flight requests and exits. Sockets passed systemd-style (LISTEN_FDS) also work.
+# The handoff socket lives in a directory only this user can enter ($XDG_RUNTIME_DIR, else a
+# private 0700 directory under the temp dir), and both ends check the peer's uid.
+HANDOFF_SOCKET = "load_balancer_{port}.sock"
+HANDOFF_TIMEOUT = 10  # seconds the old process waits for the new one to confirm it is accepting
+DRAIN_TIMEOUT = 30    # seconds in-flight requests get to finish before the old process exits
+TAKEOVER = False
+draining = False
+listeners = []        # asyncio servers accepting client connections
+client_writers = {}   # writer -> True while one of its requests is being processed
+shutdown_event = None
+
 # Connect to Redis (make sure Redis is running on localhost:6379 in WSL2)
 redis_client = redis.Redis(host='localhost', port=6379, decode_responses=True)
 
@@ -33,8 +128,10 @@ async def log_to_redis(message: str):
 
 # ------------------ JSON Helper Functions ------------------
 async def send_json(writer: StreamWriter, message: dict):
-    writer.write((json.dumps(message) + "\n").encode("utf-8"))
+    data = (json.dumps(message) + "\n").encode("utf-8")
+    writer.write(data)
     await writer.drain()
+    return len(data)
 
 async def recv_json(reader: StreamReader):
     data = await reader.readline()
@@ -45,28 +142,143 @@ async def recv_json(reader: StreamReader):
     except Exception:
         return None
 
+async def recv_request(reader: StreamReader):
+    """Like recv_json, but also return the size of the received line in bytes.
+
+    The wait for the first byte of a request is bounded by CLIENT_IDLE_TIMEOUT and the rest of
+    the line by CLIENT_READ_TIMEOUT; either raises asyncio.TimeoutError after being counted.
+    Lines longer than MAX_REQUEST_BYTES raise ValueError.
+    """
+    try:
+        first = await asyncio.wait_for(reader.read(1), CLIENT_IDLE_TIMEOUT)
+    except asyncio.TimeoutError:
+        connection_stats["idle_timeouts"] += 1
+        raise
+    if not first:
+        return None, 0
+    try:
+        data = first if first == b"\n" else first + await asyncio.wait_for(reader.readline(), CLIENT_READ_TIMEOUT)
+    except asyncio.TimeoutError:
+        connection_stats["read_timeouts"] += 1
+        raise
+    try:
+        return json.loads(data.decode("utf-8").strip()), len(data)
+    except Exception:
+        return None, len(data)
+
+# ------------------ Request Cost Model ------------------
+def request_operation(request):
+    """Return the request's operation name, or None for requests that are not well-formed objects."""
+    if not isinstance(request, dict):
+        return None
+    op = request.get("operation")
+    return op if isinstance(op, str) else None
+
+def request_size(request: dict):
+    """Map a request to the size feature its backend time grows with."""
+    op = request_operation(request)
+    if op is None:
+        return 0.0
+    value = request.get("value")
+    try:
+        if op == "fibonacci":
+            # n big-integer additions of up to O(n) digits each
+            n = max(int(value), 0)
+            return float(n) * n
+        if op == "prime":
+            return abs(int(value)) ** 0.5
+    except (TypeError, ValueError, OverflowError):
+        return 0.0
+    if isinstance(value, str):
+        return float(len(value))
+    return 0.0
+
+def estimate_cost(request: dict):
+    """Estimate the backend time of a request in milliseconds from the learned cost model.
+
+    Requests without a string operation get DEFAULT_COST_MS.
+    """
+    stats = cost_stats.get(request_operation(request))
+    if not stats:
+        return DEFAULT_COST_MS
+    weight, sum_x, sum_y, sum_xx, sum_xy = stats
+    mean_x, mean_y = sum_x / weight, sum_y / weight
+    x = request_size(request)
+    variance = sum_xx / weight - mean_x * mean_x
+    if variance > 1e-9 * max(mean_x * mean_x, 1.0):
+        slope = max((sum_xy / weight - mean_x * mean_y) / variance, 0.0)
+        estimate = mean_y + slope * (x - mean_x)
+    elif mean_x > 0:
+        # Every observation so far had the same size; assume cost is proportional to size
+        estimate = mean_y * x / mean_x
+    else:
+        estimate = mean_y
+    return max(estimate, 0.01)
+
+def observe_cost(request: dict, latency_ms: float):
+    """Fold an observed backend service time into the cost model of the request's operation.
+
+    Only operations the backends implement are learned, so clients cannot grow cost_stats
+    with made-up operation names.
+    """
+    op = request_operation(request)
+    if op not in OPERATION_CODES:
+        return
+    x = request_size(request)
+    stats = cost_stats.setdefault(op, [0.0, 0.0, 0.0, 0.0, 0.0])
+    if stats[0] >= COST_CLIP_AFTER:
+        latency_ms = min(latency_ms, COST_OUTLIER_FACTOR * estimate_cost(request))
+    for i in range(5):
+        stats[i] *= COST_DECAY
+    stats[0] += 1
+    stats[1] += x
+    stats[2] += latency_ms
+    stats[3] += x * x
+    stats[4] += x * latency_ms
+
 # ------------------ Backend Server Selection ------------------
-async def choose_backend_server():
-    """Select the next available backend server using round-robin, skipping unhealthy ones."""
+async def choose_backend_server(cost: float = DEFAULT_COST_MS, exclude=()):
+    """Select the healthy backend with the least outstanding cost, honouring the fast lane.
+
+    Ties are broken round-robin. Backends in `exclude` (already tried for this request) are skipped.
+    """
     global next_server_index
     async with status_lock:
-        for _ in range(len(backend_servers)):
-            server = backend_servers[next_server_index]
-            next_server_index = (next_server_index + 1) % len(backend_servers)
-            host, port, identifier = server
-            if server_status.get((host, port), False):
-                return server
-    return None
+        if not backend_servers:
+            return None
+        next_server_index %= len(backend_servers)
+        rotated = backend_servers[next_server_index:] + backend_servers[:next_server_index]
+        next_server_index = (next_server_index + 1) % len(backend_servers)
+        candidates = [server for server in rotated
+                      if server_status.get(server[:2], False)
+                      and server[:2] not in draining_servers
+                      and server not in exclude]
+        if cost > CHEAP_COST_MS:
+            general = [server for server in candidates if server[2] not in FAST_LANE_SERVERS]
+            candidates = general or candidates
+        if not candidates:
+            return None
+        return min(candidates, key=lambda server: outstanding_cost.get(server[:2], 0.0)
+                   / backend_capacity.get(server[:2], 1))
 
 # ------------------ Request Forwarding ------------------
 async def forward_request(request: dict):
-    """Forward a client request to an available backend server and return its response."""
+    """Forward a client request to an available backend server.
+
+    Returns (response, server); server is None when no backend could serve the request.
+    """
+    cost = estimate_cost(request)
+    tried = set()
     attempts = 0
     while attempts < len(backend_servers):
-        server = await choose_backend_server()
+        server = await choose_backend_server(cost, tried)
         if not server:
             break
+        tried.add(server)
         host, port, identifier = server
+        inflight[(host, port)] = inflight.get((host, port), 0) + 1
+        outstanding_cost[(host, port)] = outstanding_cost.get((host, port), 0.0) + cost
+        start = time.monotonic()
         try:
             reader, writer = await asyncio.open_connection(host, port)
             await send_json(writer, request)
@@ -74,45 +286,145 @@ async def forward_request(request: dict):
             writer.close()
             await writer.wait_closed()
             if response:
+                finished = time.monotonic()
+                latency_samples.append((finished, finished - start))
+                # Prefer the backend's own service time: the round trip also counts queueing
+                service_ms = response.pop("service_ms", None)
+                if not isinstance(service_ms, (int, float)):
+                    service_ms = (finished - start) * 1000
+                # Fast "invalid input" errors say nothing about what the operation costs
+                if "error" not in response:
+                    observe_cost(request, service_ms)
                 response['server_id'] = identifier
-                await log_to_redis(f"Forwarded request {request} to server {identifier}, received response {response}")
-                return response
+                return response, server
         except Exception as e:
             error_msg = f"Error connecting to backend server {server}: {e}"
             print(error_msg)
             await log_to_redis(error_msg)
             async with status_lock:
                 server_status[(host, port)] = False
+        finally:
+            inflight[(host, port)] -= 1
+            outstanding_cost[(host, port)] -= cost
         attempts += 1
     error_response = {"error": "All backend servers are down or unresponsive."}
     await log_to_redis(f"Returning error response: {error_response} for request {request}")
-    return error_response
+    return error_response, None
 
 # ------------------ Client Connection Handler ------------------
+def configure_client_socket(sock):
+    """Apply TCP_NODELAY and keepalive settings to an accepted client socket."""
+    if sock is None:
+        return
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1 if CLIENT_TCP_NODELAY else 0)
+    if CLIENT_TCP_KEEPALIVE:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for option, value in (("TCP_KEEPIDLE", TCP_KEEPALIVE_IDLE),
+                              ("TCP_KEEPINTVL", TCP_KEEPALIVE_INTERVAL),
+                              ("TCP_KEEPCNT", TCP_KEEPALIVE_COUNT)):
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+async def close_client(writer: StreamWriter):
+    """Close a client connection, aborting it if the peer does not let the buffer drain."""
+    writer.close()
+    try:
+        await asyncio.wait_for(writer.wait_closed(), CLIENT_CLOSE_TIMEOUT)
+    except (asyncio.TimeoutError, OSError):
+        writer.transport.abort()
+
 async def handle_client(reader: StreamReader, writer: StreamWriter):
+    global pending_requests, requests_unpublished
+    if connection_stats["active"] >= MAX_CONNECTIONS:
+        # Over the ceiling: answer once and drop the connection without further work
+        connection_stats["rejected"] += 1
+        rejection = {"error": "Load balancer is at its connection limit, please retry later."}
+        writer.write((json.dumps(rejection) + "\n").encode("utf-8"))
+        await close_client(writer)
+        return
+    connection_stats["active"] += 1
+    connection_stats["accepted"] += 1
+    client_writers[writer] = False
     addr = writer.get_extra_info('peername')
-    print(f"Client connected from {addr}")
-    await log_to_redis(f"Client connected from {addr}")
+    connection_id = f"{os.getpid()}-{next(connection_ids)}"
+    served = 0
+    # Everything after the slot is taken runs under try so the finally always releases it
     try:
+        configure_client_socket(writer.get_extra_info('socket'))
+        print(f"Client connected from {addr}")
+        await log_to_redis(f"Client connected from {addr}")
         while True:
-            request = await recv_json(reader)
+            try:
+                request, request_bytes = await recv_request(reader)
+            except asyncio.TimeoutError:
+                break
+            except ValueError:
+                connection_stats["oversized_requests"] += 1
+                await send_json(writer, {"error": f"Request exceeds {MAX_REQUEST_BYTES} bytes."})
+                break
             if request is None:
                 break
+            if not isinstance(request, dict):
+                # A backend would drop the connection and be marked down; answer here instead
+                await send_json(writer, {"error": "Request must be a JSON object."})
+                continue
+            client_writers[writer] = True
             print(f"Received request from {addr}: {request}")
-            await log_to_redis(f"Received request from {addr}: {request}")
-            # Increment request metric in Redis
-            await redis_client.incr("requests_processed")
-            response = await forward_request(request)
-            await send_json(writer, response)
+            requests_unpublished += 1
+            pending_requests += 1
+            arrived_at = time.time()
+            start = time.monotonic()
+            try:
+                response, server = await forward_request(request)
+            finally:
+                pending_requests -= 1
+            latency_ms = (time.monotonic() - start) * 1000
+            response_bytes = await send_json(writer, response)
+            if access_log is not None:
+                if server is None:
+                    status = STATUS_UNAVAILABLE
+                else:
+                    status = STATUS_ERROR if "error" in response else STATUS_OK
+                operation = request_operation(request)
+                try:
+                    access_log.append(time.time(), addr, server[1] if server else 0, server[2] if server else "",
+                                      operation, status, latency_ms, request_bytes, response_bytes)
+                except OSError as e:
+                    # e.g. disk full at segment rotation: drop the record, keep serving
+                    print(f"Error writing access log: {e}")
+            if trace_file is not None:
+                trace_file.write(json.dumps({
+                    "t": arrived_at,
+                    "conn": connection_id,
+                    "request": request,
+                    "latency_ms": round(latency_ms, 3),
+                    "server_id": server[2] if server else None,
+                    "error": "error" in response,
+                }) + "\n")
+            client_writers[writer] = False
+            served += 1
+            if MAX_REQUESTS_PER_CONNECTION and served >= MAX_REQUESTS_PER_CONNECTION:
+                connection_stats["request_limit_closes"] += 1
+                break
+            if draining:
+                # The response is out; the client reconnects to the new process
+                break
     except Exception as e:
         error_msg = f"Error handling client {addr}: {e}"
         print(error_msg)
-        await log_to_redis(error_msg)
+        try:
+            await log_to_redis(error_msg)
+        except Exception:
+            pass
     finally:
-        writer.close()
-        await writer.wait_closed()
+        connection_stats["active"] -= 1
+        client_writers.pop(writer, None)
+        await close_client(writer)
         print(f"Client disconnected from {addr}")
-        await log_to_redis(f"Client disconnected from {addr}")
+        try:
+            await log_to_redis(f"Client disconnected from {addr}")
+        except Exception as e:
+            print(f"Error logging disconnect of {addr}: {e}")
 
 # ------------------ Health Check for Backend Servers ------------------
 async def health_check(server):
@@ -126,6 +438,7 @@ async def health_check(server):
             if response and response.get("type") == "PONG":
                 async with status_lock:
                     server_status[(host, port)] = True
+                    backend_capacity[(host, port)] = max(1, response.get("alive", 1))
             writer.close()
             await writer.wait_closed()
         except Exception:
@@ -136,21 +449,362 @@ async def health_check(server):
         await log_to_redis(f"Health check for server {identifier} at {host}:{port} - status: {server_status[(host, port)]}")
         await asyncio.sleep(5)
 
+# ------------------ Dynamic Backend Registry ------------------
+def parse_backend_key(key: str):
+    """Parse a "host:port" registry key into (host, port), or None if it is malformed."""
+    host, _, port = key.rpartition(":")
+    try:
+        return host, int(port)
+    except ValueError:
+        print(f"Ignoring malformed backend key {key!r}")
+        return None
+
+async def apply_registry():
+    """Apply backend registrations and drain marks from Redis once.
+
+    Redis is only read before and written after the in-memory update, so status_lock is
+    never held across a Redis round-trip.
+    """
+    registry = await redis_client.hgetall("backend_registry")
+    drain_marks = await redis_client.smembers("backend_draining")
+    registered = {}
+    for key, identifier in registry.items():
+        address = parse_backend_key(key)
+        if address:
+            registered[address] = identifier
+    added, removed = [], []
+    async with status_lock:
+        draining_servers.clear()
+        for key in drain_marks:
+            address = parse_backend_key(key)
+            if address:
+                draining_servers.add(address)
+        for (host, port), identifier in registered.items():
+            if (host, port) in server_status:
+                continue
+            server = (host, port, identifier)
+            backend_servers.append(server)
+            # New backends take traffic only after their first successful health check
+            server_status[(host, port)] = False
+            inflight.setdefault((host, port), 0)
+            outstanding_cost.setdefault((host, port), 0.0)
+            health_tasks[(host, port)] = asyncio.create_task(health_check(server))
+            added.append(server)
+        for server in list(backend_servers):
+            host, port, identifier = server
+            if (host, port) in static_servers or (host, port) in registered:
+                continue
+            backend_servers.remove(server)
+            server_status.pop((host, port), None)
+            task = health_tasks.pop((host, port), None)
+            if task:
+                task.cancel()
+            removed.append(server)
+    for host, port, identifier in added:
+        await log_to_redis(f"Registered backend server {identifier} at {host}:{port}")
+    for host, port, identifier in removed:
+        await redis_client.hdel("backend_health", f"{host}:{port}")
+        await log_to_redis(f"Deregistered backend server {identifier} at {host}:{port}")
+
+async def sync_backends():
+    """Periodically apply backend registrations and drain marks from Redis."""
+    while True:
+        try:
+            await apply_registry()
+        except Exception as e:
+            print(f"Error syncing backend registry: {e}")
+        await asyncio.sleep(REGISTRY_SYNC_INTERVAL)
+
+# ------------------ Load Metrics ------------------
+def latency_percentile(fraction: float):
+    """Return the given percentile of recent forwarding latencies in milliseconds."""
+    cutoff = time.monotonic() - LATENCY_WINDOW
+    while latency_samples and latency_samples[0][0] < cutoff:
+        latency_samples.popleft()
+    if not latency_samples:
+        return 0.0
+    ordered = sorted(latency for _, latency in latency_samples)
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+    return ordered[index] * 1000
+
+async def publish_metrics():
+    """Periodically publish queue depth, latency and per-backend load to Redis.
+
+    Stops once the process starts draining, leaving the metrics to its successor.
+    """
+    global requests_unpublished
+    while not draining:
+        try:
+            if requests_unpublished:
+                count, requests_unpublished = requests_unpublished, 0
+                await redis_client.incrby("requests_processed", count)
+            healthy = [(host, port) for host, port, _ in backend_servers
+                       if server_status.get((host, port), False) and (host, port) not in draining_servers]
+            await redis_client.hset("lb_metrics", mapping={
+                "pending_requests": pending_requests,
+                "p95_latency_ms": f"{latency_percentile(0.95):.2f}",
+                "healthy_backends": len(healthy),
+                "updated_at": f"{time.time():.3f}",
+            })
+            await redis_client.hset("lb_connections", mapping=connection_stats)
+            # Snapshot both together: once a backend is in draining_servers nothing new is routed to
+            # it, so its in-flight count here is final only if it is also in the applied drain set
+            per_backend = {f"{host}:{port}": inflight.get((host, port), 0) for host, port, _ in backend_servers}
+            applied_draining = [f"{host}:{port}" for host, port in draining_servers]
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.delete("backend_inflight", "backend_draining_applied")
+                if per_backend:
+                    pipe.hset("backend_inflight", mapping=per_backend)
+                if applied_draining:
+                    pipe.sadd("backend_draining_applied", *applied_draining)
+                await pipe.execute()
+        except Exception as e:
+            print(f"Error publishing metrics: {e}")
+        await asyncio.sleep(METRICS_INTERVAL)
+
+# ------------------ Hot Restart ------------------
+def handoff_dir():
+    """Return the private directory for the handoff socket, creating it with mode 0700.
+
+    Raises PermissionError if the directory exists but is not owned by this user or is
+    accessible to others.
+    """
+    path = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(tempfile.gettempdir(), f"load_balancer-{os.getuid()}")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"{path} must be a directory owned by this user with mode 0700")
+    return path
+
+def handoff_path():
+    return os.path.join(handoff_dir(), HANDOFF_SOCKET.format(port=LB_PORT))
+
+def peer_is_same_user(conn):
+    """Check over SO_PEERCRED that the other end of a Unix socket runs as this user."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return True  # only the 0700 directory protects the socket on this platform
+    credentials = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _, uid, _ = struct.unpack("3i", credentials)
+    return uid == os.getuid()
+
+def inherited_sockets():
+    """Return listening sockets passed in systemd-style (LISTEN_PID/LISTEN_FDS, starting at fd 3)."""
+    if os.environ.get("LISTEN_PID") != str(os.getpid()):
+        return []
+    count = int(os.environ.get("LISTEN_FDS", "0"))
+    for name in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES"):
+        os.environ.pop(name, None)
+    return [socket.socket(fileno=3 + i) for i in range(count)]
+
+def request_handoff():
+    """Ask the running load balancer for its listening sockets.
+
+    Returns (sockets, control connection), or ([], None) if no load balancer answers.
+    """
+    control = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    control.settimeout(HANDOFF_TIMEOUT)
+    try:
+        control.connect(handoff_path())
+        if not peer_is_same_user(control):
+            raise PermissionError("handoff socket is owned by another user")
+        _, fds, _, _ = socket.recv_fds(control, 16, 16)
+    except OSError as e:
+        print(f"No running load balancer to take over from ({e}); binding normally")
+        control.close()
+        return [], None
+    return [socket.socket(fileno=fd) for fd in fds], control
+
+async def complete_handoff(control):
+    """Tell the old process we are accepting and wait until it has released the handoff socket.
+
+    Returns True only if the old process acknowledged with DONE; on EOF, error or timeout it
+    may still be serving. Runs on the event loop without blocking it, since the listeners
+    are already accepting.
+    """
+    loop = asyncio.get_running_loop()
+    control.setblocking(False)
+    try:
+        await loop.sock_sendall(control, b"READY")
+        return await asyncio.wait_for(loop.sock_recv(control, 4), HANDOFF_TIMEOUT) == b"DONE"
+    except (OSError, asyncio.TimeoutError):
+        return False
+    finally:
+        control.close()
+
+def remove_stale_handoff_socket(path):
+    """Unlink a handoff socket left behind by a crashed process.
+
+    A socket file is only stale if connecting to it is refused; one that accepts belongs to a
+    running load balancer, so FileExistsError is raised instead of unlinking it.
+    """
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except FileNotFoundError:
+        return
+    except ConnectionRefusedError:
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise FileExistsError(f"{path} is in use by another running load balancer")
+
+async def serve_handoff():
+    """Hand the listening sockets to a new process on request, then drain this one."""
+    loop = asyncio.get_running_loop()
+    control = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        path = handoff_path()
+        remove_stale_handoff_socket(path)
+        control.bind(path)
+        control.listen(1)
+        control.setblocking(False)
+    except OSError as e:
+        control.close()
+        error_msg = f"Hot restart unavailable: cannot create handoff socket ({e})"
+        print(error_msg)
+        await log_to_redis(error_msg)
+        return
+    owned = True
+    try:
+        while True:
+            conn, _ = await loop.sock_accept(control)
+            with conn:
+                if not peer_is_same_user(conn):
+                    error_msg = "Hot restart refused: handoff requested by another user"
+                    print(error_msg)
+                    await log_to_redis(error_msg)
+                    continue
+                fds = [sock.fileno() for server in listeners for sock in server.sockets]
+                socket.send_fds(conn, [b"LISTEN"], fds)
+                try:
+                    ready = await asyncio.wait_for(loop.sock_recv(conn, 5), HANDOFF_TIMEOUT)
+                except asyncio.TimeoutError:
+                    ready = b""
+                if ready != b"READY":
+                    # The new process exits when it does not get DONE, so only one of us keeps the port
+                    await log_to_redis("Hot restart aborted: new process did not confirm; still serving")
+                    continue
+                control.close()
+                owned = False  # the path now belongs to the new process
+                try:
+                    os.unlink(path)
+                except OSError as e:
+                    # Closed above, so the new process sees it refuse connections and removes it
+                    print(f"Error removing handoff socket {path}: {e}")
+                try:
+                    await loop.sock_sendall(conn, b"DONE")
+                except OSError as e:
+                    # Without DONE the new process exits; keep serving and offer a fresh handoff socket
+                    error_msg = f"Hot restart aborted: could not confirm the handoff ({e}); still serving"
+                    print(error_msg)
+                    await log_to_redis(error_msg)
+                    asyncio.create_task(serve_handoff())
+                    return
+            asyncio.create_task(drain("listening sockets handed to new process"))
+            return
+    finally:
+        control.close()
+        if owned:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+async def drain(reason: str):
+    """Stop accepting, let in-flight requests finish (up to DRAIN_TIMEOUT), then shut down."""
+    global draining
+    if draining:
+        return
+    draining = True
+    await log_to_redis(f"Load Balancer draining ({reason}), {len(client_writers)} client connections open")
+    for server in listeners:
+        server.close()  # closes only this process's copy of the listening sockets
+    # Connections waiting between requests are closed now; busy ones after their response
+    for writer, busy in list(client_writers.items()):
+        if not busy:
+            writer.close()
+    deadline = time.monotonic() + DRAIN_TIMEOUT
+    while client_writers and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    if client_writers:
+        await log_to_redis(f"Drain timeout: aborting {len(client_writers)} client connections")
+        for writer in list(client_writers):
+            writer.transport.abort()
+    shutdown_event.set()
+
 # ------------------ Main Function ------------------
 async def main():
-    # Initialize metric in Redis
-    await redis_client.set("requests_processed", 0)
-    await log_to_redis("Initialized requests_processed to 0")
+    global access_log, trace_file, shutdown_event
+    shutdown_event = asyncio.Event()
+    sockets, control = inherited_sockets(), None
+    if not sockets and TAKEOVER:
+        sockets, control = request_handoff()
+    if not sockets:
+        # Initialize metric in Redis (a hot restart keeps counting)
+        await redis_client.set("requests_processed", 0)
+        await log_to_redis("Initialized requests_processed to 0")
+    if ACCESS_LOG_ENABLED:
+        access_log = AccessLog(ACCESS_LOG_DIR)
+    if TRACE_PATH:
+        # Line-buffered so the trace survives a crash of the load balancer
+        trace_file = open(TRACE_PATH, "a", encoding="utf-8", buffering=1)
+        await log_to_redis(f"Recording request trace to {TRACE_PATH}")
     # Start health checks for each backend server
     for server in backend_servers:
-        asyncio.create_task(health_check(server))
-    server = await asyncio.start_server(handle_client, LB_HOST, LB_PORT)
-    addr = server.sockets[0].getsockname()
-    startup_msg = f"Load Balancer listening on {addr}"
-    print(startup_msg)
-    await log_to_redis(startup_msg)
-    async with server:
-        await server.serve_forever()
+        host, port, _ = server
+        health_tasks[(host, port)] = asyncio.create_task(health_check(server))
+    asyncio.create_task(sync_backends())
+    asyncio.create_task(publish_metrics())
+    if sockets:
+        for sock in sockets:
+            # start_server calls listen() again on inherited sockets; keep our backlog, not asyncio's 100
+            listeners.append(await asyncio.start_server(handle_client, sock=sock,
+                                                        backlog=ACCEPT_BACKLOG, limit=MAX_REQUEST_BYTES))
+    else:
+        listeners.append(await asyncio.start_server(handle_client, LB_HOST, LB_PORT,
+                                                    backlog=ACCEPT_BACKLOG, limit=MAX_REQUEST_BYTES))
+    if control is not None and not await complete_handoff(control):
+        # The old process is still serving; two load balancers must not share the port
+        error_msg = "Hot restart failed: old process did not confirm the handoff; exiting"
+        print(error_msg)
+        await log_to_redis(error_msg)
+        asyncio.create_task(drain("hot restart not confirmed"))
+    else:
+        addr = listeners[0].sockets[0].getsockname()
+        startup_msg = f"Load Balancer listening on {addr}" + (" (inherited socket)" if sockets else "")
+        print(startup_msg)
+        await log_to_redis(startup_msg)
+        if hasattr(socket, "send_fds"):
+            asyncio.create_task(serve_handoff())
+    # SIGTERM drains gracefully; the access log and trace are closed on the way out
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(drain("SIGTERM")))
+    try:
+        await shutdown_event.wait()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        try:
+            if requests_unpublished:
+                await redis_client.incrby("requests_processed", requests_unpublished)
+        except Exception as e:
+            print(f"Error publishing final request count: {e}")
+        if access_log is not None:
+            access_log.close()
+        if trace_file is not None:
+            trace_file.close()
+
+def parse_args():
+    global LB_PORT, TRACE_PATH, TAKEOVER
+    parser = argparse.ArgumentParser(description="Asynchronous load balancer.")
+    parser.add_argument("--port", type=int, default=LB_PORT, help="port to listen on")
+    parser.add_argument("--record-trace", metavar="PATH",
+                        help="append every request with its arrival time to a JSONL trace for replay.py")
+    parser.add_argument("--takeover", action="store_true",
+                        help="take over the listening socket of the running load balancer (hot restart)")
+    args = parser.parse_args()
+    LB_PORT, TRACE_PATH, TAKEOVER = args.port, args.record_trace, args.takeover
 
 if __name__ == "__main__":
+    parse_args()
     asyncio.run(main())
@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+
+# Replay configuration
+DEFAULT_TARGET = "localhost:12000"
+SERVER_FILE = "server.py"
+REQUEST_TIMEOUT = 30  # seconds to wait for a single response before counting it as failed
+FLEET_STARTUP_TIMEOUT = 10
+
+# ------------------ JSON Helper Functions ------------------
+async def send_json(writer: asyncio.StreamWriter, message: dict):
+    writer.write((json.dumps(message) + "\n").encode("utf-8"))
+    await writer.drain()
+
+async def recv_json(reader: asyncio.StreamReader):
+    data = await reader.readline()
+    if not data:
+        return None
+    try:
+        return json.loads(data.decode("utf-8").strip())
+    except Exception:
+        return None
+
+# ------------------ Trace Loading ------------------
+def load_trace(path):
+    """Read a JSONL trace written by load_balancer_async.py --record-trace, ordered by arrival."""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(entry.get("request"), dict) and "t" in entry:
+                entries.append(entry)
+    entries.sort(key=lambda entry: entry["t"])
+    return entries
+
+# ------------------ Replay ------------------
+async def replay(host, port, entries, speed):
+    """Re-issue the trace against one load balancer and return per-request results.
+
+    Requests keep their original client connection grouping; each connection sends its
+    requests in order, each no earlier than its original offset divided by `speed`
+    (speed 0 sends as fast as possible).
+    """
+    loop = asyncio.get_running_loop()
+    connections = {}
+    for entry in entries:
+        connections.setdefault(entry.get("conn"), []).append(entry)
+    trace_start = entries[0]["t"]
+    replay_start = loop.time()
+    results = []
+
+    async def run_connection(items):
+        reader = writer = None
+        for entry in items:
+            scheduled = replay_start + (entry["t"] - trace_start) / speed if speed > 0 else replay_start
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sent = loop.time()
+            response = None
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(host, port)
+                await send_json(writer, entry["request"])
+                response = await asyncio.wait_for(recv_json(reader), REQUEST_TIMEOUT)
+            except (OSError, asyncio.TimeoutError):
+                pass
+            if response is None and writer is not None:
+                # Broken or timed-out connection; reconnect for the next request
+                writer.close()
+                writer = None
+            results.append({
+                "operation": entry["request"].get("operation"),
+                "latency_ms": (loop.time() - sent) * 1000,
+                "lag_ms": max(0.0, sent - scheduled) * 1000,
+                "ok": bool(response) and "error" not in response,
+                "failed": response is None,
+                "server_id": response.get("server_id") if response else None,
+            })
+        if writer is not None:
+            writer.close()
+
+    await asyncio.gather(*(run_connection(items) for items in connections.values()))
+    return results, loop.time() - replay_start
+
+# ------------------ Reporting ------------------
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+def summarize(results, elapsed):
+    latencies = sorted(result["latency_ms"] for result in results)
+    per_op = {}
+    for result in results:
+        per_op.setdefault(result["operation"] or "unknown", []).append(result["latency_ms"])
+    per_server = {}
+    for result in results:
+        if result["server_id"]:
+            per_server[result["server_id"]] = per_server.get(result["server_id"], 0) + 1
+    return {
+        "requests": len(results),
+        "errors": sum(1 for result in results if not result["ok"]),
+        "failed": sum(1 for result in results if result["failed"]),
+        "duration_s": elapsed,
+        "throughput_rps": len(results) / elapsed if elapsed > 0 else 0.0,
+        "mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50_ms": percentile(latencies, 0.5),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_ms": latencies[-1] if latencies else 0.0,
+        "mean_lag_ms": sum(result["lag_ms"] for result in results) / len(results) if results else 0.0,
+        "p95_by_op_ms": {op: percentile(sorted(values), 0.95) for op, values in per_op.items()},
+        "requests_by_server": per_server,
+    }
+
+def summarize_recorded(entries):
+    """Summary of the latencies the load balancer measured while recording the trace."""
+    results = [{
+        "operation": entry["request"].get("operation"),
+        "latency_ms": entry.get("latency_ms", 0.0),
+        "lag_ms": 0.0,
+        # Same rule as replayed results; traces without the flag only know whether a backend answered
+        "ok": not entry["error"] if "error" in entry else entry.get("server_id") is not None,
+        "failed": False,
+        "server_id": entry.get("server_id"),
+    } for entry in entries]
+    return summarize(results, entries[-1]["t"] - entries[0]["t"])
+
+def print_report(summaries):
+    """Print the summaries side by side, one column per target."""
+    names = list(summaries)
+    width = max(14, *(len(name) + 2 for name in names))
+    rows = [
+        ("requests", "requests", "{:.0f}"),
+        ("errors", "errors", "{:.0f}"),
+        ("no response", "failed", "{:.0f}"),
+        ("duration s", "duration_s", "{:.2f}"),
+        ("throughput r/s", "throughput_rps", "{:.1f}"),
+        ("mean ms", "mean_ms", "{:.2f}"),
+        ("p50 ms", "p50_ms", "{:.2f}"),
+        ("p95 ms", "p95_ms", "{:.2f}"),
+        ("p99 ms", "p99_ms", "{:.2f}"),
+        ("max ms", "max_ms", "{:.2f}"),
+        ("send lag ms", "mean_lag_ms", "{:.2f}"),
+    ]
+    print("".ljust(18) + "".join(name.rjust(width) for name in names))
+    for label, key, fmt in rows:
+        print(label.ljust(18) + "".join(fmt.format(summaries[name][key]).rjust(width) for name in names))
+    operations = sorted({op for summary in summaries.values() for op in summary["p95_by_op_ms"]})
+    for op in operations:
+        cells = [summaries[name]["p95_by_op_ms"].get(op) for name in names]
+        print(f"p95 {op} ms"[:18].ljust(18) + "".join(("-" if cell is None else f"{cell:.2f}").rjust(width) for cell in cells))
+    servers = sorted({server for summary in summaries.values() for server in summary["requests_by_server"]})
+    for server in servers:
+        print(f"to server {server}"[:18].ljust(18)
+              + "".join(str(summaries[name]["requests_by_server"].get(server, 0)).rjust(width) for name in names))
+    if "recorded" in summaries:
+        print("\n'recorded' latencies were measured inside the load balancer; replayed ones at the client.")
+
+# ------------------ Backend Fleet ------------------
+def ping(port):
+    try:
+        with socket.create_connection(("localhost", port), timeout=1) as s:
+            s.sendall((json.dumps({"type": "PING"}) + "\n").encode("utf-8"))
+            return b"PONG" in s.recv(1024)
+    except OSError:
+        return False
+
+def start_fleet(ports, workers):
+    """Start server.py on each port (identifiers A, B, C, ...) and wait until all answer PING."""
+    processes = []
+    for i, port in enumerate(ports):
+        server_id = chr(ord("A") + i) if i < 26 else f"S{i}"
+        processes.append(subprocess.Popen(["python", SERVER_FILE, server_id, str(port), "--workers", str(workers)],
+                                          stdout=subprocess.DEVNULL))
+    deadline = time.time() + FLEET_STARTUP_TIMEOUT
+    while not all(ping(port) for port in ports):
+        if time.time() > deadline:
+            stop_fleet(processes)
+            raise SystemExit(f"Backend fleet on ports {ports} did not start within {FLEET_STARTUP_TIMEOUT}s")
+        time.sleep(0.2)
+    return processes
+
+def stop_fleet(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait()
+
+# ------------------ Main ------------------
+def parse_target(value):
+    """Parse NAME=HOST:PORT or HOST:PORT."""
+    name, _, address = value.rpartition("=")
+    host, _, port = address.rpartition(":")
+    return name or address, host or "localhost", int(port)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded request trace against one or more load balancers.")
+    parser.add_argument("trace", help="JSONL trace written by load_balancer_async.py --record-trace")
+    parser.add_argument("--target", action="append", type=parse_target,
+                        help=f"load balancer to replay against as [NAME=]HOST:PORT; repeat to compare (default {DEFAULT_TARGET})")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="time multiplier: 1 = original timing, 2 = twice as fast, 0 = as fast as possible")
+    parser.add_argument("--fleet", help="comma-separated ports to start server.py backends on for the replay")
+    parser.add_argument("--fleet-workers", type=int, default=1, help="--workers for each started backend")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    args = parser.parse_args()
+    if args.speed < 0:
+        parser.error("--speed must not be negative")
+
+    entries = load_trace(args.trace)
+    if not entries:
+        sys.exit(f"No requests found in trace {args.trace}")
+    targets = args.target or [parse_target(DEFAULT_TARGET)]
+    fleet = start_fleet([int(port) for port in args.fleet.split(",")], args.fleet_workers) if args.fleet else []
+
+    summaries = {}
+    if all("latency_ms" in entry for entry in entries):
+        summaries["recorded"] = summarize_recorded(entries)
+    try:
+        for name, host, port in targets:
+            print(f"Replaying {len(entries)} requests against {name} ({host}:{port}) at speed {args.speed}...")
+            results, elapsed = asyncio.run(replay(host, port, entries, args.speed))
+            summaries[name] = summarize(results, elapsed)
+    finally:
+        stop_fleet(fleet)
+    print()
+    print_report(summaries)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, indent=2)
+
+if __name__ == "__main__":
+    main()
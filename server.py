@@ -1,6 +1,10 @@
+import argparse
 import asyncio
 import json
-import sys
+import socket
+import time
+
+from supervisor import count_request, pong_message, supervise
 
 # --- Utility Functions ---
 
@@ -89,10 +93,17 @@ async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.Stream
         await writer.wait_closed()
         return
     if msg.get("type") == "PING":
-        await send_json(writer, {"type": "PONG"})
+        await send_json(writer, pong_message())
     else:
         print(f"Server {server_id} received request from {addr}: {msg}")
-        response = process_request(msg)
+        count_request(1, 0)
+        started = time.perf_counter()
+        try:
+            response = process_request(msg)
+        finally:
+            count_request(-1, 1)
+        # Time spent on the request itself, excluding any wait in the accept queue
+        response["service_ms"] = round((time.perf_counter() - started) * 1000, 3)
         response["server_id"] = server_id
         await send_json(writer, response)
     writer.close()
@@ -100,16 +111,29 @@ async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.Stream
 
 # --- Main Server Startup ---
 
-async def main():
-    if len(sys.argv) != 3:
-        print("Usage: python server.py <server_id> <port>")
-        sys.exit(1)
-    server_id = sys.argv[1]
-    port = int(sys.argv[2])
-    server = await asyncio.start_server(lambda r, w: handle_connection(r, w, server_id), "0.0.0.0", port)
+async def serve(server_id: str, port: int, sock: socket.socket = None):
+    if sock is None:
+        server = await asyncio.start_server(lambda r, w: handle_connection(r, w, server_id), "0.0.0.0", port)
+    else:
+        server = await asyncio.start_server(lambda r, w: handle_connection(r, w, server_id), sock=sock)
     print(f"Backend Server {server_id} listening on port {port}")
     async with server:
         await server.serve_forever()
 
+def main():
+    parser = argparse.ArgumentParser(usage="python server.py <server_id> <port> [--workers N]")
+    parser.add_argument("server_id")
+    parser.add_argument("port", type=int)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of pre-forked worker processes sharing the port")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers == 1:
+        asyncio.run(serve(args.server_id, args.port))
+    else:
+        supervise(args.server_id, args.port, args.workers,
+                  lambda sock: asyncio.run(serve(args.server_id, args.port, sock)), "0.0.0.0", 100)
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -1,8 +1,10 @@
+import argparse
 import socket
 import json
-import sys
 import time
 
+from supervisor import count_request, pong_message, supervise
+
 def send_json(sock, message):
     """Send a JSON message with newline termination."""
     sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
@@ -50,31 +52,49 @@ def handle_connection(conn, addr, server_id):
         conn.close()
         return
     if msg.get("type") == "PING":
-        send_json(conn, {"type": "PONG"})
+        send_json(conn, pong_message())
     elif msg.get("type") is None:
         # Assume it's a client request forwarded by the load balancer.
         print(f"Server {server_id} received request from LB: {msg}")
-        response = process_request(msg)
+        count_request(1, 0)
+        started = time.perf_counter()
+        try:
+            response = process_request(msg)
+        finally:
+            count_request(-1, 1)
+        # Time spent on the request itself, excluding any wait in the accept queue
+        response["service_ms"] = round((time.perf_counter() - started) * 1000, 3)
         # Add server ID to the response for demonstration.
         response["server_id"] = server_id
         send_json(conn, response)
     conn.close()
 
-def main():
-    if len(sys.argv) != 3:
-        print("Usage: python server.py <server_id> <port>")
-        sys.exit(1)
-    server_id = sys.argv[1]
-    port = int(sys.argv[2])
-    
-    srv_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    srv_sock.bind(('localhost', port))
-    srv_sock.listen(5)
+def serve(server_id, port, srv_sock=None):
+    """Accept and handle connections one at a time."""
+    if srv_sock is None:
+        srv_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        srv_sock.bind(('localhost', port))
+        srv_sock.listen(5)
     print(f"Backend Server {server_id} listening on port {port}")
 
     while True:
         conn, addr = srv_sock.accept()
         handle_connection(conn, addr, server_id)
 
+def main():
+    parser = argparse.ArgumentParser(usage="python server.py <server_id> <port> [--workers N]")
+    parser.add_argument("server_id")
+    parser.add_argument("port", type=int)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of pre-forked worker processes sharing the port")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers == 1:
+        serve(args.server_id, args.port)
+    else:
+        supervise(args.server_id, args.port, args.workers,
+                  lambda sock: serve(args.server_id, args.port, sock), 'localhost', 5)
+
 if __name__ == "__main__":
     main()
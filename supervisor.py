@@ -0,0 +1,110 @@
+import multiprocessing
+import signal
+import socket
+import sys
+import time
+
+# --- Worker Configuration ---
+
+# In --workers mode each worker owns one slot of a shared counter array: [pid, inflight, served].
+# pid is 0 while the worker is down.
+SLOT_FIELDS = 3
+RESTART_BACKOFF = 1  # seconds before a crashed worker is restarted
+worker_stats = None
+worker_slot = None
+
+# --- Worker State ---
+
+def pong_message():
+    """Build the PING reply, aggregating the counters of all workers in --workers mode."""
+    if worker_stats is None:
+        return {"type": "PONG"}
+    workers = len(worker_stats) // SLOT_FIELDS
+    alive = inflight = served = 0
+    for i in range(workers):
+        pid, busy, done = worker_stats[i * SLOT_FIELDS:(i + 1) * SLOT_FIELDS]
+        alive += 1 if pid else 0
+        inflight += busy
+        served += done
+    return {"type": "PONG", "workers": workers, "alive": alive, "inflight": inflight, "served": served}
+
+def count_request(delta_inflight: int, delta_served: int):
+    if worker_stats is not None:
+        base = worker_slot * SLOT_FIELDS
+        worker_stats[base + 1] += delta_inflight
+        worker_stats[base + 2] += delta_served
+
+# --- Pre-Fork Supervisor ---
+
+def reuseport_socket(host: str, port: int, backlog: int = None):
+    """Create a socket bound to the port with SO_REUSEPORT so several workers can share it.
+
+    The socket only listens when a backlog is given.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    if backlog is not None:
+        sock.listen(backlog)
+    return sock
+
+def run_worker(serve, host: str, port: int, backlog: int, slot: int, stats):
+    """Entry point of a forked worker: hand its own listening socket on the shared port to `serve`."""
+    global worker_stats, worker_slot
+    worker_stats, worker_slot = stats, slot
+    stats[slot * SLOT_FIELDS + 1] = 0
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor handles Ctrl+C
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    serve(reuseport_socket(host, port, backlog))
+
+def supervise(server_id: str, port: int, workers: int, serve, host: str, backlog: int):
+    """Pre-fork `workers` processes sharing the port and restart any that crash.
+
+    Each worker calls `serve(sock)` with a listening socket bound to (host, port).
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        print("--workers requires SO_REUSEPORT, which this platform does not support")
+        sys.exit(1)
+    # Held (bound, not listening) for the supervisor's lifetime so the port cannot be
+    # taken by another process while a worker restarts; it never receives connections.
+    reservation = reuseport_socket(host, port)
+    ctx = multiprocessing.get_context("fork")
+    stats = ctx.Array("q", workers * SLOT_FIELDS, lock=False)
+    processes = [None] * workers
+    restart_at = [0.0] * workers
+
+    def start_worker(slot: int):
+        process = ctx.Process(target=run_worker, args=(serve, host, port, backlog, slot, stats), daemon=True)
+        process.start()
+        stats[slot * SLOT_FIELDS] = process.pid
+        processes[slot] = process
+
+    # SIGTERM (e.g. from the dashboard's Stop button) shuts the workers down with the supervisor
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for slot in range(workers):
+            start_worker(slot)
+        print(f"Backend Server {server_id} supervising {workers} workers on port {port}")
+        while True:
+            now = time.monotonic()
+            for slot, process in enumerate(processes):
+                if process.is_alive():
+                    continue
+                if stats[slot * SLOT_FIELDS]:
+                    print(f"Worker {slot} of server {server_id} (pid {process.pid}) exited with code {process.exitcode}, restarting")
+                    stats[slot * SLOT_FIELDS] = 0
+                    restart_at[slot] = now + RESTART_BACKOFF
+                elif now >= restart_at[slot]:
+                    start_worker(slot)
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in processes:
+            if process is not None:
+                process.join()
+        reservation.close()